@@ -27,6 +27,18 @@ import time
 import _thread
 from pimoroni import Button, Analog
 
+# NumPy and Numba only exist on CPython ports / desktop previews; stock MicroPython uses the per-pixel path below
+try:
+    import numpy as np
+    HAVE_NUMPY = True
+except ImportError:
+    HAVE_NUMPY = False
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = HAVE_NUMPY
+except ImportError:
+    HAVE_NUMBA = False
+
 #-- Parameters --
 
 # USER CONTROLS
@@ -39,8 +51,13 @@ from pimoroni import Button, Analog
 # HiRez (button Y): temporarily doubles resolution (toggles back). Adds detail into the otherwise blank-looking central area
 
 # USER SETTINGS
-MAX_ITER = 15 # low values eg 8 are less intricate, but show pattern better. Above 20-30 make little difference, but draw more slowly
-# MAX_ITER is temporarily doubled / restored (toggle) by button Y (HiRez)
+MAX_ITER_LO = 15 # low values eg 8 are less intricate, but show pattern better. Above 20-30 make little difference, but draw more slowly
+MAX_ITER_HI = 30 # used instead while button Y (HiRez) is toggled on
+MAX_ITER = MAX_ITER_LO
+PERIODICITY_MIN_ITER = 1000 # from this many iterations up, stop early on points whose orbit has settled into a repeating cycle.
+# Below it the extra checks cost more time than they save
+USE_FP64 = False # NumPy / Numba path only: iterate in float64 rather than float32. float32 is quicker, and plenty until zoomed in
+# to about 1e-6 per pixel, where the frame is switched to float64 automatically anyway
 print("Max number of Iterations is ", MAX_ITER)
 
 MAX_COLOURS = 10 # will only use the first MAX of the colours specified in the list above
@@ -62,18 +79,25 @@ WIDTH, HEIGHT = display.get_bounds() # gets display size, expecting 240, 240
 width2 = WIDTH >> 1 #int(WIDTH / 2)
 height2 = HEIGHT >> 1 #int(HEIGHT / 2)
 
+def rgb332(r, g, b):
+    # The byte that display.create_pen(r, g, b) gives with PEN_RGB332: top 3 bits of red and green, top 2 of blue.
+    # Working it out here saves a call into PicoGraphics for every pen
+    return (r & 0xE0) | ((g & 0xE0) >> 3) | (b >> 6)
+
 # Special colours
-WHITE = display.create_pen(255, 255, 255)
-BLACK = display.create_pen(0, 0, 0)
-#YELLOW = display.create_pen(255, 255, 0)
-#PINK = display.create_pen(90, 10, 90)
-#RED = display.create_pen(255, 0, 0)
-# Otherwise: colour = display.create_pen(r, g, b)
+WHITE = rgb332(255, 255, 255)
+BLACK = rgb332(0, 0, 0)
+#YELLOW = rgb332(255, 255, 0)
+#PINK = rgb332(90, 10, 90)
+#RED = rgb332(255, 0, 0)
+# Otherwise: colour = rgb332(r, g, b)
 
 # Assign own framebuffer so we can read from it (to be able to restore colours under cursor when it is moved)
 display.set_framebuffer(None)
 buffer = bytearray(int(WIDTH*HEIGHT))
 display.set_framebuffer(buffer)
+buffer_mv = memoryview(buffer) # for copying runs of pixels in and out of the framebuffer in one go
+white_row = bytes([WHITE]) * WIDTH # source for drawing horizontal lines of the cursor straight into the framebuffer
 
 # assign storage for colours about to be overwritten by cursor rectangle
 top_pix = bytearray(WIDTH)
@@ -84,40 +108,186 @@ top_pix[0], bottom_pix[0], left_pix[0], right_pix[0] = 0,0,0,0
 
 left0, right0, top0, bottom0, left, right, top, bottom = 0,0,0,0,0,0,0,0
 
-results = [False] * HEIGHT # One column of the display. Initialize thread result to all off
-resultsReady = False
+STRIPE = 16 # width in columns of the stripes that the thread and main take turns to compute
+# Thread result (pen values) for each of its stripes, laid out like the framebuffer but only STRIPE pixels wide, so each row
+# of a stripe can be copied to the screen in one go. A bytearray, as a list would need 4 bytes per pixel
+results = bytearray(STRIPE * HEIGHT * len(range(0, WIDTH, 2 * STRIPE)))
+results_mv = memoryview(results)
+job_x = -1 # first column of the stripes posted to the worker thread, or -2 to tell it to finish
+job_lock = _thread.allocate_lock() # held until DrawMandelbrotX posts a frame in job_x for the worker thread
+done_lock = _thread.allocate_lock() # held until the worker thread has finished its stripes of the frame
+xs, ys = [], [] # real part of c for each column, imaginary part for each row. Set up by DrawMandelbrotX for each frame
+computedRows = HEIGHT # rows from the top that are computed; any below are mirror images of rows above. Also set per frame
+
+PREVIEW_STRIDES = (8, 4) # coarse previews drawn before the full-detail pass, computing one pixel per stride x stride block
+# Pen of each block of the latest coarse preview, a column of blocks at a time, and whether each needs computing in full
+samples, sampleStride, sampleRows = bytearray(0), 1, 0
+refine = bytearray(0)
+
+if HAVE_NUMPY:
+    frameIters = np.empty((HEIGHT, WIDTH), np.uint8) # iteration count of every pixel, filled by mandel_frame()
+    frame = np.frombuffer(buffer, np.uint8).reshape((HEIGHT, WIDTH)) # the framebuffer, viewed as rows of pixels
+
+def mandelbrot(cx, cy, max_iter):
+    # max_iter is passed in (normally MAX_ITER) so the loop below tests a local rather than looking up a global each time.
+    # z = z*z + c done on the real and imaginary parts separately, so no complex objects are created and
+    # |z| <= 2 is tested as zr*zr + zi*zi <= 4 without a square root
+    q = (cx - 0.25)**2 + cy*cy
+    if q*(q + (cx - 0.25)) < 0.25*cy*cy or (cx + 1.0)**2 + cy*cy < 0.0625:
+        return max_iter + 1 # inside the main cardioid or the period-2 bulb, so would never escape
+    zr, zi, zr2, zi2, n = 0.0, 0.0, 0.0, 0.0, 0
+    while zr2 + zi2 <= 4.0 and n <= max_iter:
+        zi = 2.0*zr*zi + cy
+        zr = zr2 - zi2 + cx
+        zr2 = zr*zr
+        zi2 = zi*zi
+        n += 1
+    return n
 
-def mandelbrot(c):
-    global MAX_ITER
-    mz,n = 0,0 # changed z to mz as z is used elsewhere for zoom
-    while abs(mz) <= 2 and n <= MAX_ITER:
-        mz = mz*mz + c
+def mandelbrotPeriodic(cx, cy, max_iter):
+    # As mandelbrot(), but also saves z every 20 iterations and stops as soon as z comes back to (very nearly) the saved value:
+    # the orbit is then periodic, so the point is inside the set. Worth it only for large max_iter (see PERIODICITY_MIN_ITER)
+    q = (cx - 0.25)**2 + cy*cy
+    if q*(q + (cx - 0.25)) < 0.25*cy*cy or (cx + 1.0)**2 + cy*cy < 0.0625:
+        return max_iter + 1 # inside the main cardioid or the period-2 bulb, so would never escape
+    zr, zi, zr2, zi2, n = 0.0, 0.0, 0.0, 0.0, 0
+    old_zr, old_zi, period = 0.0, 0.0, 0
+    while zr2 + zi2 <= 4.0 and n <= max_iter:
+        zi = 2.0*zr*zi + cy
+        zr = zr2 - zi2 + cx
+        zr2 = zr*zr
+        zi2 = zi*zi
+        if abs(zr - old_zr) < 1e-7 and abs(zi - old_zi) < 1e-7:
+            return max_iter + 1
+        period += 1
+        if period >= 20:
+            period = 0
+            old_zr, old_zi = zr, zi
         n += 1
     return n
 
+if HAVE_NUMBA:
+    TILE = 16 # the kernel works through the frame in TILE x TILE blocks of pixels
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def mandel_frame(cxs, cys, max_iter, out):
+        # Whole-frame equivalent of mandelbrot(), using real floats rather than complex numbers.
+        # cxs / cys hold the real part of each column and imaginary part of each row, and set whether it runs in float32 or float64.
+        # Tiles are shared out across the CPU cores; each is computed into a small local block (which stays in L1 cache)
+        # and then copied into out
+        W, H = cxs.shape[0], cys.shape[0]
+        f = cxs.dtype.type # plain literals would be float64, and quietly promote float32 arithmetic to it
+        zero, quarter, one, two, four, bulb = f(0.0), f(0.25), f(1.0), f(2.0), f(4.0), f(0.0625)
+        tilesX = (W + TILE - 1) // TILE
+        tilesY = (H + TILE - 1) // TILE
+        for t in prange(tilesX * tilesY):
+            tx0 = (t % tilesX) * TILE
+            ty0 = (t // tilesX) * TILE
+            tile = np.empty((TILE, TILE), np.uint8)
+            for ty in range(TILE):
+                if ty0 + ty >= H:
+                    break
+                cy = cys[ty0 + ty]
+                for tx in range(TILE):
+                    if tx0 + tx >= W:
+                        break
+                    cx = cxs[tx0 + tx]
+                    q = (cx - quarter)*(cx - quarter) + cy*cy
+                    if q*(q + (cx - quarter)) < quarter*cy*cy or (cx + one)*(cx + one) + cy*cy < bulb:
+                        tile[ty, tx] = max_iter + 1 # main cardioid or period-2 bulb, as in mandelbrot()
+                        continue
+                    zr, zi, zr2, zi2, n = zero, zero, zero, zero, 0
+                    while zr2 + zi2 <= four and n <= max_iter: # |z| <= 2 without the square root
+                        zi = two*zr*zi + cy
+                        zr = zr2 - zi2 + cx
+                        zr2 = zr*zr
+                        zi2 = zi*zi
+                        n += 1
+                    tile[ty, tx] = n
+            th = min(TILE, H - ty0) # tiles on the right and bottom edges may overhang the frame
+            tw = min(TILE, W - tx0)
+            out[ty0 : ty0 + th, tx0 : tx0 + tw] = tile[:th, :tw]
+
+elif HAVE_NUMPY:
+    def mandel_frame(cxs, cys, max_iter, out):
+        # Same results as the Numba kernel, but each step of the iteration is a NumPy operation on every pixel at once.
+        # Pixels that have escaped (or are inside the cardioid / bulb) stop being counted, though their z keeps being updated.
+        # Python float constants don't widen the arrays, so everything stays in the dtype of cxs / cys
+        W, H = cxs.shape[0], cys.shape[0]
+        cx = cxs[np.newaxis, :] # one row, broadcast down the frame
+        cy = cys[:, np.newaxis] # one column, broadcast across
+        q = (cx - 0.25)**2 + cy*cy
+        inside = (q*(q + (cx - 0.25)) < 0.25*cy*cy) | ((cx + 1.0)**2 + cy*cy < 0.0625)
+        zr = np.zeros((H, W), cxs.dtype)
+        zi = np.zeros((H, W), cxs.dtype)
+        alive = ~inside
+        out[:] = 0
+        with np.errstate(over='ignore', invalid='ignore'): # escaped pixels overflow to inf / nan, which is harmless here
+            for _ in range(max_iter + 1):
+                zr2 = zr*zr
+                zi2 = zi*zi
+                alive &= zr2 + zi2 <= 4.0
+                out += alive
+                zi = 2.0*zr*zi + cy
+                zr = zr2 - zi2 + cx
+        out[inside] = max_iter + 1
+
+def mandelbrotColumn(x, out, base, step):
+    # Computes the pen value of every pixel in column x, storing row y in out[base + y*step].
+    # Blocks that the coarse preview found to be all one colour just get that colour, and rows from computedRows down are mirrored
+    global MAX_ITER, PERIODICITY_MIN_ITER, iter_to_byte
+    global HEIGHT, xs, ys, computedRows
+    global samples, sampleStride, sampleRows, refine
+    # Globals are looked up by name on every use, so take local copies of everything used in the loops
+    _mandelbrot = mandelbrotPeriodic if MAX_ITER >= PERIODICITY_MIN_ITER else mandelbrot
+    _max_iter, _lut, _ys = MAX_ITER, iter_to_byte, ys
+    _H, _rows, _stride = HEIGHT, computedRows, sampleStride
+    _samples, _refine = samples, refine
+    xx = xs[x]
+    b = (x // _stride) * sampleRows # block at the top of this column
+    for y0 in range(0, _rows, _stride):
+        y1 = min(y0 + _stride, _rows)
+        if _refine[b]:
+            for y in range(y0, y1):
+                m = _mandelbrot(xx, _ys[y], _max_iter) # Compute the number of iterations for that pixel
+                #print("(",x,y,") m=",m)
+                out[base + y*step] = _lut[m] # pen value, ready for the framebuffer
+        else:
+            pen = _samples[b]
+            for y in range(y0, y1):
+                out[base + y*step] = pen
+        b += 1
+    for y in range(_rows, _H): # mirror image of the rows above the real axis
+        out[base + y*step] = out[base + (_H - y)*step]
+
 def mandelbrotThreadX(x):
-    global MAX_ITER
-    global WIDTH, HEIGHT, realStart, realEnd, imStart, imEnd
-    global results, resultsReady
+    # Computes every other stripe of STRIPE columns, starting with the stripe at column x.
+    # Each stripe is stored in results as HEIGHT rows of STRIPE pixels
+    global WIDTH, HEIGHT, STRIPE
+    global results
     #print("Thread Begin x=",x)
-    xx = realStart + (x / WIDTH) * (realEnd - realStart)
-    #for y in range(HEIGHT): # IC merged into following loop
-        #results[y]=False
-    for y in range(HEIGHT):
-        results[y]=False
-        yy = imStart + (y / HEIGHT) * (imEnd - imStart)
-        c = complex(xx, yy) # Convert pixel coordinate to complex number
-        m = mandelbrot(c)   # Compute the number of iterations
-        colour = int(m - 1) % 15 # restrict to colour 0-15 # int(m - 1) if specifying all 200+ colours
-        #print("(",x,y,") m=",m,"colour=",colour)
-        results[y] = colour # >0
-    resultsReady = True
+    i = 0 # start of the current stripe in results
+    for x0 in range(x, WIDTH, 2 * STRIPE):
+        for x1 in range(x0, min(x0 + STRIPE, WIDTH)):
+            mandelbrotColumn(x1, results, i + x1 - x0, STRIPE)
+        i += STRIPE * HEIGHT
     #print("Thread Done x=", x)
-    _thread.exit() # when done, commit suicide so we could be re-incarnated for next X.
+
+def mandelbrotWorker():
+    # Started once by Setup() and runs on the second core for the life of the program,
+    # computing the stripes that DrawMandelbrotX posts in job_x
+    global job_x, job_lock, done_lock
+    while True:
+        job_lock.acquire() # sleeps until the next frame is posted, leaving the memory bus to the other core
+        if job_x == -2: # program is finishing
+            break
+        mandelbrotThreadX(job_x)
+        done_lock.release() # let DrawMandelbrotX know the results are ready
 
 def DrawMandelbrotX():
-    global isHiRez, nextRefresh, MAX_ITER
-    global results, resultsReady
+    global isHiRez, nextRefresh, MAX_ITER, iter_to_byte
+    global results, results_mv, buffer_mv, xs, ys, computedRows, job_x, job_lock, done_lock
+    global PREVIEW_STRIDES, USE_FP64
     print("DRAWINGX: RealStart End", realStart, realEnd, "imStart End", imStart, imEnd)
     stopWatch = time.ticks_ms()
     RE_START = realStart
@@ -125,45 +295,123 @@ def DrawMandelbrotX():
     IM_START = imStart
     IM_END = imEnd
 
-    for x in range(0, WIDTH, 2): # We're drawing two columns at a time. One by the thread, the other by main.
-        resultsReady=False # Will be set by thread to True when it's done computing column.
-        _thread.start_new_thread(mandelbrotThreadX,(x,))
-        
-        x1 = x+1
-        #print("Main begin x1=",x1)
-        xx = RE_START + (x1 / WIDTH) * (RE_END - RE_START)
-        for y in range(0, HEIGHT, 1):
-            yy = IM_START + (y / HEIGHT) * (IM_END - IM_START)
-            c = complex(xx, yy) # Convert pixel coordinate to complex number
-            m = mandelbrot(c)   # Compute the number of iterations for that pixel
-            colour = int(m - 1) % MAX_COLOURS # restrict to colour 0-MAX # int(m - 1) if specifying all 200+ colours
-            if colour > 0:
-                display.set_pen(display.create_pen(pen_colour[colour][0], pen_colour[colour][1], pen_colour[colour][2]))
-                display.pixel(x1,y)
-        #print("Main End x1=",x1)
-                   
-        #stopwatchStart = time.ticks_ms()
-        while not resultsReady:
-            pass
-        #print("waited ", time.ticks_ms()-stopwatchStart, "ms")
-        
-        # Plot the X column computed by the thread
+    if HAVE_NUMPY: # compute the whole frame in one call (compiled by Numba if available), then just plot it
+        ftype = np.float64 if USE_FP64 else np.float32
+        if ftype == np.float32 and (RE_END - RE_START) / WIDTH < 1e-6:
+            print("Zoomed in beyond float32 precision, using float64")
+            ftype = np.float64
+        cxs = (RE_START + (np.arange(WIDTH) / WIDTH) * (RE_END - RE_START)).astype(ftype)
+        cys = (IM_START + (np.arange(HEIGHT) / HEIGHT) * (IM_END - IM_START)).astype(ftype)
+        mandel_frame(cxs, cys, MAX_ITER, frameIters)
+        frame[:] = np.frombuffer(iter_to_byte, np.uint8)[frameIters] # look up every pixel's pen in one go
+        display.update()
+        return
+
+    # Work out the coordinates of each column and row once, rather than for every pixel
+    xs = [RE_START + (x / WIDTH) * (RE_END - RE_START) for x in range(WIDTH)]
+    ys = [IM_START + (y / HEIGHT) * (IM_END - IM_START) for y in range(HEIGHT)]
+
+    # The set is symmetric about the real axis. If the view is centred on it (to within a pixel), row HEIGHT-y is
+    # the mirror image of row y, so only the rows down to the axis need computing and the rest are copied
+    dy = (IM_END - IM_START) / HEIGHT
+    if IM_START <= 0 <= IM_END and abs(IM_START + IM_END) < dy:
+        computedRows = (HEIGHT >> 1) + 1
+    else:
+        computedRows = HEIGHT
+
+    # Quick low-resolution previews, so there is something to see while the full-detail pass is computed
+    for stride in PREVIEW_STRIDES:
+        DrawMandelbrotCoarse(stride)
+    MarkBlocksToRefine()
+
+    # The screen is split into stripes of STRIPE columns; the thread takes alternate stripes and main does those in between.
+    # Interleaving stripes rather than splitting the screen in half keeps the slow central columns shared between both cores,
+    # and means only having to wait for the thread once per frame
+    job_x = 0 # hand the stripes starting at columns 0, 2*STRIPE, 4*STRIPE... to the worker thread
+    job_lock.release()
+
+    for x0 in range(STRIPE, WIDTH, 2 * STRIPE):
+        for x in range(x0, min(x0 + STRIPE, WIDTH)):
+            #print("Main begin x=",x)
+            mandelbrotColumn(x, buffer, x, WIDTH) # write pens straight into framebuffer rather than set_pen + pixel
+            #print("Main End x=",x)
+        display.update() # each update sends the whole framebuffer to the display, so only show progress once per stripe
+
+    #stopwatchStart = time.ticks_ms()
+    done_lock.acquire() # blocks, rather than polling, until the thread has done all its stripes
+    #print("waited ", time.ticks_ms()-stopwatchStart, "ms")
+
+    # Plot the stripes computed by the thread, copying a whole row of each stripe at a time
+    i = 0
+    for x0 in range(0, WIDTH, 2 * STRIPE):
+        w = min(STRIPE, WIDTH - x0)
         for y in range(HEIGHT):
-            # brotFB.pixel(x,y, 1 if results[y] else 0)
-            if results[y]:
-                display.set_pen(display.create_pen(pen_colour[results[y]][0], pen_colour[results[y]][1], pen_colour[results[y]][2]))
-                display.pixel(x,y)
-
-        if x % 2 == 0: # No need to refresh everytime we go through X loop
-            display.update()
+            buffer_mv[x0 + (y * WIDTH) : x0 + (y * WIDTH) + w] = results_mv[i : i + w]
+            i += STRIPE
 
     display.update()
     
+def DrawMandelbrotCoarse(stride):
+    # Computes just the top-left pixel of each stride x stride block and fills the whole block with its colour.
+    # The pens are kept in samples, so MarkBlocksToRefine() can see which blocks are all one colour
+    global WIDTH, HEIGHT, xs, ys, iter_to_byte, MAX_ITER, PERIODICITY_MIN_ITER, buffer
+    global samples, sampleStride, sampleRows
+    sampleStride = stride
+    sampleRows = (HEIGHT + stride - 1) // stride
+    samples = bytearray(sampleRows * ((WIDTH + stride - 1) // stride))
+    _mandelbrot = mandelbrotPeriodic if MAX_ITER >= PERIODICITY_MIN_ITER else mandelbrot # local copies for the loops
+    _max_iter, _lut, _ys = MAX_ITER, iter_to_byte, ys
+    _W, _H, _buffer, _samples = WIDTH, HEIGHT, buffer, samples
+    i = 0
+    for x0 in range(0, _W, stride):
+        xx = xs[x0]
+        x1 = min(x0 + stride, _W)
+        for y0 in range(0, _H, stride):
+            pen = _lut[_mandelbrot(xx, _ys[y0], _max_iter)]
+            _samples[i] = pen
+            i += 1
+            for y in range(y0, min(y0 + stride, _H)):
+                for x in range(x0, x1):
+                    _buffer[x + (y * _W)] = pen
+    display.update()
+
+def MarkBlocksToRefine():
+    # A block of the last coarse preview only needs computing in full if the samples at its four corners
+    # (its own and those of the blocks to the right, below, and diagonally) are not all the same colour.
+    # Blocks on the right and bottom edges have no samples beyond them, so are always computed
+    global samples, sampleRows, refine
+    _samples, rows = samples, sampleRows # local copies for the loops
+    columns = len(_samples) // rows
+    refine = _refine = bytearray(len(_samples))
+    for bx in range(columns - 1):
+        b = bx * rows
+        for by in range(rows - 1):
+            pen = _samples[b]
+            if pen != _samples[b + 1] or pen != _samples[b + rows] or pen != _samples[b + rows + 1]:
+                _refine[b] = 1
+            b += 1
+        _refine[b] = 1 # bottom edge
+    for b in range((columns - 1) * rows, len(_refine)): # right edge
+        _refine[b] = 1
+
+def MakeIterLUT():
+    # Look-up table from the result of mandelbrot() (1 to MAX_ITER+1) straight to the pen value of its colour,
+    # so drawing a pixel is a single table read. Has to be remade whenever MAX_ITER changes
+    global iter_to_byte, pen_lut, MAX_ITER, MAX_COLOURS
+    iter_to_byte = bytearray(MAX_ITER + 2)
+    for i in range(len(iter_to_byte)):
+        iter_to_byte[i] = pen_lut[(i - 1) % MAX_COLOURS]
+
 def Setup():
     global mPot0, mPot1, mZoomPot
     global buttonZoomIn, buttonZoomOut, buttonCenter, buttonRez
+    global pen_lut
     
     print("Starting Setup()")
+    # Pen value of each colour in use, created once so pixels can be written straight into the framebuffer.
+    # MAX_COLOURS never changes, so unlike iter_to_byte this doesn't need remaking
+    pen_lut = bytes([rgb332(*rgb) for rgb in pen_colour[:MAX_COLOURS]])
+    MakeIterLUT()
     mPot0 = Analog(26) # X axis
     mPot1 = Analog(27) # Y axis
     mZoomPot = Analog(28) # Zoom
@@ -172,6 +420,10 @@ def Setup():
     buttonCenter =  Button(13) # button B
     buttonZoomOut = Button(14) # button X
     buttonRez =     Button(15) # button Y
+
+    job_lock.acquire() # both locks start held: there is no frame for the worker yet, nor results from it
+    done_lock.acquire()
+    _thread.start_new_thread(mandelbrotWorker, ()) # computes alternate stripes on the second core
  
 def getCursorX(pot):
     global WIDTH
@@ -191,7 +443,7 @@ def MoveCursor():
     global nextSensorRead
     global left0, right0, top0, bottom0 # previous positions
     global left, right, top, bottom
-    global buffer
+    global buffer, buffer_mv, white_row
     global WIDTH, HEIGHT
     global x0, y0, z # centre of cursor; zoom
     global newHeight, newWidth # half height & width of cursor box
@@ -222,9 +474,13 @@ def MoveCursor():
             if left0 + right0 + top0 + bottom0 != 0: # don't restore if there isn't a previous cursor
                 #print("Restoring previous cursor rectangle")
                 #print("Prev cursor: left0, right0, top0, bottom0:", left0, right0, top0, bottom0)
-                for i in range(right0 - left0 +1): 
-                    buffer[left0 + i -1 + (top0 * WIDTH)] = top_pix[i] # -1 is to allow for corner pixel being stored once
-                    buffer[left0 + i + (bottom0 * WIDTH)] = bottom_pix[i] 
+                # Horizontal edges are contiguous in the framebuffer, so are copied back as a single slice each
+                n = right0 - left0 +1
+                t = left0 -1 + (top0 * WIDTH) # -1 is to allow for corner pixel being stored once
+                k = min(max(-t, 0), n) # skip any part of the top edge that would be before the start of the framebuffer
+                buffer_mv[t + k : t + n] = top_pix[k : n]
+                b = left0 + (bottom0 * WIDTH)
+                buffer_mv[b : b + n] = bottom_pix[:n]
                 for i in range(bottom0 - top0 +1):
                     buffer[left0 + ((top0 + i) * WIDTH)] = left_pix[i]
                     buffer[right0 + ((top0 + i -1) * WIDTH)] = right_pix[i]
@@ -233,19 +489,22 @@ def MoveCursor():
                         
             # store new cursor rectangle outline
             #print("New cursor: left, right, top, bottom:", left, right, top, bottom)
-            for i in range(right - left +1):
-                top_pix[i] = buffer[left + i -1 + (top * WIDTH)] # -1 is to allow for corner pixel being stored once
-                bottom_pix[i] = buffer[left + i + (bottom * WIDTH)]  
+            n = right - left +1
+            t = left -1 + (top * WIDTH) # -1 is to allow for corner pixel being stored once
+            k = min(max(-t, 0), n)
+            top_pix[k : n] = buffer_mv[t + k : t + n]
+            b = left + (bottom * WIDTH)
+            bottom_pix[:n] = buffer_mv[b : b + n]
             for i in range(bottom - top +1):
                 left_pix[i] = buffer[left + ((top + i) * WIDTH)]
                 right_pix[i] = buffer[right + ((top + i -1) * WIDTH)]
                 
-            # draw cursor rectangle outline
-            display.set_pen(WHITE)
-            display.line(left,top,      right,top)
-            display.line(right,top,     right,bottom)
-            display.line(left, bottom,  right,bottom)
-            display.line(left,top,      left,bottom)
+            # draw cursor rectangle outline straight into the framebuffer, all within the pixels stored above
+            buffer_mv[left + (top * WIDTH) : right + 1 + (top * WIDTH)] = white_row[:n]
+            buffer_mv[left + (bottom * WIDTH) : right + 1 + (bottom * WIDTH)] = white_row[:n]
+            for y in range(top, bottom +1):
+                buffer[left + (y * WIDTH)] = WHITE
+                buffer[right + (y * WIDTH)] = WHITE
             
             display.update()
             left0, right0, top0, bottom0 = left, right, top, bottom # store current values 
@@ -294,14 +553,12 @@ def ZoomOut():
     return pressed
 
 def ChangeRez():
-    global buttonRez, isHiRez, MAX_ITER
+    global buttonRez, isHiRez, MAX_ITER, MAX_ITER_LO, MAX_ITER_HI
     pressed = buttonRez.is_pressed
     if pressed:
         isHiRez = not isHiRez
-        if isHiRez:
-            MAX_ITER = MAX_ITER *2
-        else:
-            MAX_ITER = MAX_ITER /2
+        MAX_ITER = MAX_ITER_HI if isHiRez else MAX_ITER_LO
+        MakeIterLUT()
         print("isHiRez=", isHiRez)
         time.sleep_ms(500) # Allow human to release button
     return pressed
@@ -362,8 +619,14 @@ def Loop():
             MoveCursor()
 
 def main():
+    global job_x, job_lock
     Setup()
-    Loop()
+    try:
+        Loop()
+    finally:
+        job_x = -2 # stop the worker thread when the program is interrupted
+        if job_lock.locked():
+            job_lock.release()
 
 # Run program
 main()